@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+SQLite storage shared by the utterance caches and the auth probe state.
+The database runs in WAL mode, so several generator processes can read
+concurrently while one writes, and a cache write touches only its own row.
+"""
+
+import os
+import sqlite3
+import threading
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "utterances")
+DB_PATH = os.path.join(CACHE_DIR, "cache.sqlite3")
+
+# Cache entries older than this are treated as misses and regenerated
+CACHE_TTL = 30 * 24 * 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS utterance_cache(
+    key TEXT PRIMARY KEY,
+    utterances TEXT NOT NULL,
+    created_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS semantic_cache(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    intention TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    utterances TEXT NOT NULL,
+    created_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS auth_state(
+    method TEXT PRIMARY KEY,
+    created_at INTEGER NOT NULL
+);
+"""
+
+_conn = None
+_conn_lock = threading.Lock()
+
+
+def connect() -> sqlite3.Connection:
+    """Return the shared autocommit connection, creating the database on first use."""
+    global _conn
+    if _conn is None:
+        with _conn_lock:
+            if _conn is None:
+                os.makedirs(CACHE_DIR, exist_ok=True)
+                # Autocommit: every statement is its own short transaction
+                conn = sqlite3.connect(DB_PATH, isolation_level=None, timeout=5,
+                                       check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+                _conn = conn
+    return _conn
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Retry policy for transient Gemini API failures.
+Rate limits, temporary outages and responses with too few usable utterances are
+retried with jittered exponential backoff; anything else (e.g. an invalid request)
+fails immediately.
+"""
+
+from google.api_core.exceptions import DeadlineExceeded, ResourceExhausted, ServiceUnavailable
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+
+from utterance_core import IncompleteResponseError
+
+RETRIABLE_ERRORS = (ResourceExhausted, ServiceUnavailable, DeadlineExceeded, IncompleteResponseError)
+MAX_ATTEMPTS = 5
+# Upper bound on a server-requested delay, so a bad hint can't stall the run
+MAX_RETRY_DELAY = 60
+
+_backoff = wait_random_exponential(min=1, max=30)
+
+
+def _wait(retry_state) -> float:
+    """Honor the server's retry delay when it sends one, otherwise back off with jitter."""
+    error = retry_state.outcome.exception()
+    seconds = getattr(getattr(error, 'retry_delay', None), 'seconds', None)
+    if seconds:
+        return min(float(seconds), MAX_RETRY_DELAY)
+    return _backoff(retry_state)
+
+
+def _log_retry(retry_state):
+    error = retry_state.outcome.exception()
+    print(f"⚠️  Gemini request failed ({type(error).__name__}), "
+          f"retrying in {retry_state.next_action.sleep:.1f}s...")
+
+
+gemini_retry = retry(
+    retry=retry_if_exception_type(RETRIABLE_ERRORS),
+    wait=_wait,
+    stop=stop_after_attempt(MAX_ATTEMPTS),
+    before_sleep=_log_retry,
+    reraise=True,
+)
@@ -4,12 +4,38 @@ Utterance Intention Generator using Google ADK and Gemini Flash LLM
 Simple script to generate diverse utterances for a given intention.
 """
 
-import csv
+from __future__ import annotations
+
 import asyncio
+import csv
 import os
-from datetime import datetime
+import sqlite3
+import subprocess
+import time
+from contextlib import aclosing
 from dotenv import load_dotenv
 
+import cache_db
+import utterance_cache
+from gemini_retry import gemini_retry
+from utterance_core import (
+    CSV_HEADER,
+    PROMPT_TEMPLATE,
+    SYSTEM_PROMPT,
+    UTTERANCE_COUNT,
+    IncompleteResponseError,
+    clean_line,
+    get_model,
+    get_user_input,
+    new_output_path,
+    open_csv,
+    pad_utterances,
+    parse_utterances,
+    remove_output,
+    save_to_csv,
+    write_csv,
+)
+
 # Load environment variables from .env file if it exists
 load_dotenv()
 from google.adk.agents import LlmAgent
@@ -19,6 +45,34 @@ from google.adk.artifacts import InMemoryArtifactService
 from google.adk.memory.in_memory_memory_service import InMemoryMemoryService
 
 
+# gcloud login state rarely changes within a shell session, so a successful
+# probe is remembered for an hour instead of spawning gcloud on every run
+AUTH_STATE_TTL = 3600
+
+
+def _cached_gcloud_auth() -> bool:
+    """Return True if a recent gcloud probe succeeded."""
+    try:
+        row = cache_db.connect().execute(
+            "SELECT 1 FROM auth_state WHERE method = 'gcloud' AND created_at > ?",
+            (int(time.time()) - AUTH_STATE_TTL,),
+        ).fetchone()
+        return row is not None
+    except (sqlite3.Error, OSError):
+        return False
+
+
+def _save_gcloud_auth():
+    """Remember a successful gcloud probe."""
+    try:
+        cache_db.connect().execute(
+            "INSERT OR REPLACE INTO auth_state(method, created_at) VALUES ('gcloud', ?)",
+            (int(time.time()),),
+        )
+    except (sqlite3.Error, OSError):
+        pass
+
+
 def setup_authentication():
     """Set up Google Cloud authentication for ADK."""
     print("🔐 Setting up authentication...")
@@ -35,56 +89,36 @@ def setup_authentication():
         print(f" Using service account: {service_account_path}")
         return True
     
-    # Method 3: Check for gcloud auth
+    # Method 3: Check environment variables (cheap, so before spawning gcloud)
+    project_id = os.getenv('GOOGLE_CLOUD_PROJECT') or os.getenv('GCP_PROJECT')
+    if project_id:
+        print(f" Using project: {project_id}")
+        return True
+    
+    # Method 4: Check for gcloud auth, reusing a recent successful probe
+    if _cached_gcloud_auth():
+        print(" Using gcloud authentication (cached)")
+        return True
     try:
-        import subprocess
         result = subprocess.run(['gcloud', 'auth', 'list', '--format=value(account)'], 
                               capture_output=True, text=True, timeout=10)
         if result.returncode == 0 and result.stdout.strip():
             print(" Using gcloud authentication")
+            _save_gcloud_auth()
             return True
     except (subprocess.TimeoutExpired, FileNotFoundError):
         pass
-    
-    # Method 4: Check environment variables
-    project_id = os.getenv('GOOGLE_CLOUD_PROJECT') or os.getenv('GCP_PROJECT')
-    if project_id:
-        print(f" Using project: {project_id}")
-        return True
     print("No valid Google authentication found!")
     
     return False
 
 
-def get_user_input():
-    """Get user input for the intention/context."""
-    print("Hello! 👋 Welcome to the Utterance Generator.")
-    intention = input("Please enter an intention: ").strip()
-    
-    if not intention:
-        print("No intention provided. Exiting.")
-        return None
-    
-    return intention
-
-
 def create_agent() -> LlmAgent:
     """Create the ADK LLM agent for utterance generation using standard authentication."""
     return LlmAgent(
         model="gemini-2.5-flash",
         name="Utterance_Generator",
-        instruction="""
-        **Role:** You are an expert utterance generator. 
-        Your responsibility is to generate diverse, natural utterances for given intentions or contexts.
-        
-        **Core Directives:**
-        * Generate exactly 10 diverse utterances for the given intention
-        * Make each utterance unique in structure, tone, and wording
-        * Vary sentence length, formality, and perspective
-        * Keep utterances natural and conversational
-        * Focus on different ways people might express the same intent
-        * Return only the utterances, one per line, without numbering or formatting
-        """,
+        instruction=SYSTEM_PROMPT,
     )
 
 
@@ -103,73 +137,178 @@ def create_agent_with_api_key(api_key: str = None) -> LlmAgent:
     return LlmAgent(
         model="gemini-2.5-flash",
         name="Utterance_Generator",
-        instruction="""
-        **Role:** You are an expert utterance generator. 
-        Your responsibility is to generate diverse, natural utterances for given intentions or contexts.
-        
-        **Core Directives:**
-        * Generate exactly 10 diverse utterances for the given intention
-        * Make each utterance unique in structure, tone, and wording
-        * Vary sentence length, formality, and perspective
-        * Keep utterances natural and conversational
-        * Focus on different ways people might express the same intent
-        * Return only the utterances, one per line, without numbering or formatting
-        """,
+        instruction=SYSTEM_PROMPT,
     )
 
 
+async def _call_gemini(prompt: str):
+    """Open a streamed Gemini response for prompt."""
+    return await get_model(SYSTEM_PROMPT).generate_content_async(prompt, stream=True)
+
+
+async def stream_utterances(prompt: str):
+    """Yield cleaned utterances one by one as the streamed Gemini response arrives."""
+    response = await _call_gemini(prompt)
+    
+    # Only the trailing partial line is buffered, so the buffer stays small
+    tail = ""
+    async for chunk in response:
+        try:
+            text = chunk.text
+        except ValueError:
+            # Chunks without text parts (e.g. the final metadata chunk)
+            continue
+        *complete, tail = (tail + text).split('\n')
+        for line in complete:
+            cleaned = clean_line(line)
+            if cleaned:
+                yield cleaned
+    
+    cleaned = clean_line(tail)
+    if cleaned:
+        yield cleaned
+
+
 async def generate_utterances_direct_api(intention: str):
     """Generate utterances using Google Generative AI directly (fallback method)."""
     try:
-        import google.generativeai as genai
+        prompt = PROMPT_TEMPLATE.format(intention)
+
+        # Skip the API call entirely if this exact request was answered before
+        cache_key = utterance_cache.make_key("gemini-2.5-flash", SYSTEM_PROMPT + prompt, intention)
+        cached = utterance_cache.get(cache_key)
+        if cached:
+            print("Using cached utterances...")
+            return cached
         
-        api_key = os.getenv('GOOGLE_API_KEY')
-        if not api_key:
-            raise ValueError("GOOGLE_API_KEY not found in environment variables")
+        print("Using direct Generative AI API...")
+        utterances = await _collect_utterances(prompt, intention)
+        utterance_cache.set(cache_key, utterances)
+        return utterances
         
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        prompt = f"""Generate 10 diverse utterances for this intention: "{intention}"
+    except Exception as e:
+        print(f"Error with direct API: {e}")
+        return None
 
-Make each utterance unique and natural. Vary the:
-- Sentence structure and length
-- Level of formality
-- Perspective (first person, questions, statements)
-- Specific words and phrasing
 
-Return exactly 10 utterances, one per line, without numbers or bullet points."""
+@gemini_retry
+async def _collect_utterances(prompt: str, intention: str):
+    """Stream one response and return exactly 10 utterances (retried as a whole)."""
+    utterances = [utterance async for utterance in stream_utterances(prompt)]
+    return pad_utterances(utterances, f"Alternative expression: {intention}")
 
-        print("Using direct Generative AI API...")
-        response = model.generate_content(prompt)
-        
-        if response and response.text:
-            utterances = []
-            
-            for line in response.text.split('\n'):
-                cleaned = line.strip()
-                if cleaned and not cleaned.startswith(('-', '•', '*', '1.', '2.')):
-                    # Remove any numbering at the start
-                    if cleaned and cleaned[0].isdigit() and '.' in cleaned[:5]:
-                        cleaned = cleaned.split('.', 1)[1].strip()
-                    if cleaned:
-                        utterances.append(cleaned)
-            
-            # Ensure we have exactly 10 utterances
-            while len(utterances) < 10:
-                utterances.append(f"Alternative expression: {intention}")
-            
-            return utterances[:10]
+
+async def generate_and_save(intention: str, filepath: str):
+    """Generate utterances with the direct API, writing each CSV row as it streams in.
+    
+    Returns the utterances written, or None on failure (no partial file is left behind).
+    """
+    prompt = PROMPT_TEMPLATE.format(intention)
+    cache_key = utterance_cache.make_key("gemini-2.5-flash", SYSTEM_PROMPT + prompt, intention)
+    try:
+        cached = utterance_cache.get(cache_key)
+        if cached:
+            print("Using cached utterances...")
+            write_csv(filepath, cached, intention)
+            return cached
         
-        return None
+        print("Using direct Generative AI API...")
+        utterances = await _stream_to_csv(prompt, intention, filepath)
+        utterance_cache.set(cache_key, utterances)
+        return utterances
         
     except Exception as e:
         print(f"Error with direct API: {e}")
+        remove_output(filepath)
         return None
 
 
+@gemini_retry
+async def _stream_to_csv(prompt: str, intention: str, filepath: str):
+    """Stream one response into filepath; each retry rewrites the file from scratch."""
+    utterances = []
+    with open_csv(filepath) as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(CSV_HEADER)
+        # Stop after 10 rows; aclosing shuts the stream instead of draining it
+        async with aclosing(stream_utterances(prompt)) as stream:
+            async for utterance in stream:
+                utterances.append(utterance)
+                writer.writerow((len(utterances), utterance, intention))
+                csvfile.flush()
+                if len(utterances) == UTTERANCE_COUNT:
+                    break
+        
+        # Ensure we have exactly 10 utterances, writing only the added fallback rows
+        streamed = len(utterances)
+        utterances = pad_utterances(utterances, f"Alternative expression: {intention}")
+        writer.writerows(
+            (i, utterance, intention)
+            for i, utterance in enumerate(utterances[streamed:], streamed + 1)
+        )
+    return utterances
+
+
+# Maximum number of Gemini requests in flight during generate_many
+MAX_CONCURRENCY = 10
+
+
+async def generate_many(intentions: list[str]):
+    """Generate utterances for many intentions concurrently.
+    
+    Returns a list aligned with intentions; failed entries are None.
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    
+    async def generate_one(intention: str):
+        async with semaphore:
+            return await generate_utterances_direct_api(intention)
+    
+    return await asyncio.gather(*(generate_one(intention) for intention in intentions))
+
+
+# In-flight agent runs keyed by response cache key, so concurrent callers
+# asking for the same intention share one Gemini call
+_inflight: dict[str, asyncio.Future] = {}
+_inflight_lock = asyncio.Lock()
+
+
 async def generate_utterances(agent: LlmAgent, intention: str):
     """Generate utterances using the ADK agent."""
+    # Create prompt for utterance generation; the agent instruction carries the rest
+    prompt = PROMPT_TEMPLATE.format(intention)
+    cache_key = utterance_cache.make_key(agent.model, SYSTEM_PROMPT + prompt, intention)
+    
+    async with _inflight_lock:
+        pending = _inflight.get(cache_key)
+        if pending is None:
+            future = asyncio.get_running_loop().create_future()
+            _inflight[cache_key] = future
+    
+    if pending is not None:
+        print("Waiting for an identical request already in progress...")
+        # Copy so one caller mutating its result cannot affect the others
+        result = await asyncio.shield(pending)
+        return list(result) if result is not None else None
+    
+    utterances = None
+    try:
+        utterances = await _run_agent(agent, intention, prompt, cache_key)
+        return utterances
+    finally:
+        future.set_result(utterances)
+        del _inflight[cache_key]
+
+
+async def _run_agent(agent: LlmAgent, intention: str, prompt: str, cache_key: str):
+    """Run the ADK agent for a single prompt and parse its utterances."""
     try:
+        # Skip the agent run entirely if this exact request was answered before
+        cached = utterance_cache.get(cache_key)
+        if cached:
+            print("Using cached utterances...")
+            return cached
+        
         print("Generating utterances using Gemini Flash...")
         
         # Create runner for the agent
@@ -181,17 +320,6 @@ async def generate_utterances(agent: LlmAgent, intention: str):
             memory_service=InMemoryMemoryService(),
         )
         
-        # Create prompt for utterance generation
-        prompt = f"""Generate 10 diverse utterances for this intention: "{intention}"
-        
-Make each utterance unique and natural. Vary the:
-- Sentence structure and length
-- Level of formality
-- Perspective (first person, questions, statements)
-- Specific words and phrasing
-
-Return exactly 10 utterances, one per line, without numbers or bullet points."""
-        
         # Create session and run agent
         session_id = "utterance_session"
         user_id = "utterance_user"
@@ -210,8 +338,8 @@ Return exactly 10 utterances, one per line, without numbers or bullet points."""
             parts=[types.Part(text=prompt)]
         )
         
-        # Run the agent and collect response
-        response_text = ""
+        # Run the agent and collect response parts, joined once at the end
+        parts_out: list[str] = []
         async for event in runner.run_async(
             session_id=session_id,
             user_id=user_id,
@@ -222,32 +350,26 @@ Return exactly 10 utterances, one per line, without numbers or bullet points."""
                     for candidate in event.response.candidates:
                         if hasattr(candidate, 'content') and candidate.content:
                             for part in candidate.content.parts:
-                                if hasattr(part, 'text'):
-                                    response_text += part.text
-            elif hasattr(event, 'text'):
-                response_text += event.text
+                                if hasattr(part, 'text') and part.text:
+                                    parts_out.append(part.text)
+            elif hasattr(event, 'text') and event.text:
+                parts_out.append(event.text)
+        response_text = "".join(parts_out)
         
         # Parse the response to get utterances
         if response_text.strip():
-            utterances = []
-            
-            for line in response_text.split('\n'):
-                cleaned = line.strip()
-                if cleaned and not cleaned.startswith(('-', '•', '*', '1.', '2.')):
-                    # Remove any numbering at the start
-                    if cleaned and cleaned[0].isdigit() and '.' in cleaned[:5]:
-                        cleaned = cleaned.split('.', 1)[1].strip()
-                    if cleaned:
-                        utterances.append(cleaned)
-            
-            # Ensure we have exactly 10 utterances
-            while len(utterances) < 10:
-                utterances.append(f"Alternative expression: {intention}")
-            
-            return utterances[:10]
+            utterances = pad_utterances(
+                parse_utterances(response_text), f"Alternative expression: {intention}"
+            )
+            utterance_cache.set(cache_key, utterances)
+            return utterances
         
         return None
         
+    except IncompleteResponseError as e:
+        # main() falls back to the direct API, which retries on its own
+        print(f"ADK response incomplete: {e}")
+        return None
     except Exception as e:
         print(f"Error generating utterances: {e}")
         import traceback
@@ -255,48 +377,6 @@ Return exactly 10 utterances, one per line, without numbers or bullet points."""
         return None
 
 
-def save_to_csv(utterances, intention):
-    """Save utterances to CSV with timestamp filename in separate folder."""
-    try:
-        # Create output directory with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_dir = f"utterance_outputs_{datetime.now().strftime('%Y%m%d')}"
-        
-        # Create directory if it doesn't exist
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-            print(f"📁 Created output directory: {output_dir}")
-        
-        # Create filename with full timestamp
-        filename = f"utterances_{timestamp}.csv"
-        filepath = os.path.join(output_dir, filename)
-        
-        # Prepare data for CSV
-        csv_data = []
-        for i, utterance in enumerate(utterances, 1):
-            csv_data.append({
-                'id': i,
-                'utterance': utterance,
-                'original_intention': intention
-            })
-        
-        # Write to CSV
-        with open(filepath, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['id', 'utterance', 'original_intention']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            
-            writer.writeheader()
-            for row in csv_data:
-                writer.writerow(row)
-        
-        print(f"Done! 10 utterances saved in {filepath} ")
-        return filepath
-        
-    except Exception as e:
-        print(f"Error saving to CSV: {e}")
-        return None
-
-
 async def main():
     """Main function to run the utterance generator."""
     try:
@@ -331,10 +411,12 @@ async def main():
         # Generate utterances using ADK
         utterances = await generate_utterances(agent, intention)
         
-        # If ADK method fails, try direct API method
+        # If ADK method fails, try direct API method, streaming rows straight to disk
+        filepath = None
         if not utterances:
             print("ADK method failed, trying direct API...")
-            utterances = await generate_utterances_direct_api(intention)
+            filepath = new_output_path()
+            utterances = await generate_and_save(intention, filepath)
         
         if not utterances:
             print("Failed to generate utterances. Please try again.")
@@ -346,8 +428,11 @@ async def main():
         for i, utterance in enumerate(utterances, 1):
             print(f"{i:2d}. {utterance}")
         
-        # Save to CSV
-        save_to_csv(utterances, intention)
+        # Save to CSV (the direct API path has already written its file)
+        if filepath is None:
+            save_to_csv(utterances, intention)
+        else:
+            print(f"Done! {len(utterances)} utterances saved in {filepath} ✅")
         
     except KeyboardInterrupt:
         print("\n\nOperation cancelled by user.")
@@ -4,119 +4,237 @@ Simple Utterance Generator using Google Generative AI
 Direct API approach for reliable utterance generation.
 """
 
-import csv
-import os
-from datetime import datetime
+from __future__ import annotations
+
+import json
 from dotenv import load_dotenv
 
+import semantic_cache
+import utterance_cache
+from gemini_retry import gemini_retry
+from utterance_core import IncompleteResponseError, get_model, get_user_input, pad_utterances, save_to_csv
+
 # Load environment variables
 load_dotenv()
 
 
-def get_user_input():
-    """Get user input for the intention/context."""
-    print("Hello! 👋 Welcome to the Utterance Generator.")
-    intention = input("Please enter an intention: ").strip()
-    
-    if not intention:
-        print("No intention provided. Exiting.")
-        return None
-    
-    return intention
+# Maximum number of intentions packed into a single Gemini call
+BATCH_SIZE = 10
 
+BATCH_SYSTEM_PROMPT = (
+    "For each intention in the given JSON list, generate 10 diverse, natural utterances. "
+    "Vary sentence structure, length, formality and perspective. "
+    'Return JSON: {"results": [{"intention": str, "utterances": [str x10]}]}'
+)
 
-def generate_utterances_simple(intention: str):
-    """Generate utterances using Google Generative AI directly."""
-    try:
-        import google.generativeai as genai
-        
-        api_key = os.getenv('GOOGLE_API_KEY')
-        if not api_key:
-            print("❌ GOOGLE_API_KEY not found!")
-            print("Please set your API key in the .env file")
-            return None
-        
-        print("Generating utterances using Gemini Flash...")
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        
-        prompt = f"""Generate 10 diverse utterances for this intention: "{intention}"
 
-Make each utterance unique and natural. Vary the:
-- Sentence structure and length
-- Level of formality  
-- Perspective (first person, questions, statements)
-- Specific words and phrasing
+# Common intentions answered without calling the API at all. Keys are
+# lowercase and at least two words, so get_user_input can accept them
+_CANNED_RESPONSES = {
+    "say hello": [
+        "Hello!",
+        "Hi there",
+        "Hey, how's it going?",
+        "Good morning",
+        "Good evening to you",
+        "Hi, nice to meet you",
+        "Hey!",
+        "Hello, is anyone there?",
+        "Greetings",
+        "Howdy",
+    ],
+    "say goodbye": [
+        "Goodbye!",
+        "Bye for now",
+        "See you later",
+        "Talk to you soon",
+        "I have to go now",
+        "Catch you later",
+        "Have a nice day, bye",
+        "That's all for today, goodbye",
+        "Take care",
+        "I'm done, thanks, bye",
+    ],
+    "thank you": [
+        "Thank you!",
+        "Thanks a lot",
+        "Thanks, that helps",
+        "I really appreciate it",
+        "Thank you so much for your help",
+        "Cheers",
+        "Many thanks",
+        "That's great, thanks",
+        "Thanks for sorting that out",
+        "I'm grateful for your help",
+    ],
+}
+
+
+def _call_gemini(prompt: str):
+    """Send one batch prompt to Gemini, asking for a JSON response."""
+    return get_model(BATCH_SYSTEM_PROMPT).generate_content(
+        prompt,
+        generation_config={"response_mime_type": "application/json"},
+    )
+
 
-Return exactly 10 utterances, one per line, without numbers or bullet points."""
+def _strip_utterances(raw_utterances):
+    """Keep only non-empty string utterances from a parsed JSON list."""
+    if not isinstance(raw_utterances, list):
+        return []
+    return [u.strip() for u in raw_utterances if isinstance(u, str) and u.strip()]
 
-        response = model.generate_content(prompt)
+
+def _generate_batch(batch_intentions: list[str]):
+    """Generate utterances for one batch of intentions.
+    
+    Intentions that come back with too few utterances are re-requested on
+    retry. Returns a dict of intention -> utterances for those that succeeded.
+    """
+    generated = {}
+    
+    @gemini_retry
+    def attempt():
+        missing = [i for i in dict.fromkeys(batch_intentions) if i not in generated]
+        response = _call_gemini(json.dumps(missing, ensure_ascii=False))
+        try:
+            entries = json.loads(response.text).get('results', [])
+        except (ValueError, AttributeError) as e:
+            raise IncompleteResponseError(f"malformed JSON response: {e}")
+        if not isinstance(entries, list):
+            entries = []
         
-        if response and response.text:
-            utterances = []
-            
-            for line in response.text.split('\n'):
-                cleaned = line.strip()
-                if cleaned and not cleaned.startswith(('-', '•', '*')):
-                    # Remove any numbering at the start
-                    if cleaned and len(cleaned) > 2 and cleaned[0].isdigit() and '.' in cleaned[:5]:
-                        cleaned = cleaned.split('.', 1)[1].strip()
-                    if cleaned:
-                        utterances.append(cleaned)
-            
-            # Ensure we have exactly 10 utterances
-            while len(utterances) < 10:
-                utterances.append(f"Alternative way to say: {intention}")
-            
-            return utterances[:10]
+        # Match entries to intentions by name first, remembering which entries were used
+        requested = set(missing)
+        by_intention, matched_positions = {}, set()
+        for position, entry in enumerate(entries):
+            name = entry.get('intention') if isinstance(entry, dict) else None
+            if isinstance(name, str) and name in requested and name not in by_intention:
+                by_intention[name] = entry.get('utterances')
+                matched_positions.add(position)
         
-        return None
+        # Response order is only trustworthy when every intention got exactly one entry
+        use_order = len(entries) == len(missing)
+        for position, intention in enumerate(missing):
+            raw = by_intention.get(intention)
+            # Fall back to response order if the model rephrased the intention;
+            # anything else stays incomplete and is requested again on retry
+            if (raw is None and use_order and position not in matched_positions
+                    and isinstance(entries[position], dict)):
+                raw = entries[position].get('utterances')
+            try:
+                generated[intention] = pad_utterances(
+                    _strip_utterances(raw), f"Alternative way to say: {intention}"
+                )
+            except IncompleteResponseError:
+                pass
         
+        incomplete = len(missing) - sum(1 for i in missing if i in generated)
+        if incomplete:
+            raise IncompleteResponseError(f"{incomplete} intention(s) came back incomplete")
+    
+    try:
+        attempt()
     except Exception as e:
         print(f"Error generating utterances: {e}")
-        return None
+    return generated
 
 
-def save_to_csv(utterances, intention):
-    """Save utterances to CSV with timestamp filename in separate folder."""
+def generate_utterances_batch(intentions: list[str]):
+    """Generate utterances for several intentions, packing up to BATCH_SIZE per Gemini call.
+    
+    Returns a list aligned with intentions; failed entries are None.
+    """
+    results = [None] * len(intentions)
     try:
-        # Create output directory with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_dir = f"utterance_outputs_{datetime.now().strftime('%Y%m%d')}"
-        
-        # Create directory if it doesn't exist
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-            print(f"📁 Created output directory: {output_dir}")
+        # Skip the API call entirely for intentions answered before; repeated
+        # intentions are generated once and copied to every position
+        pending = {}
+        for index, intention in enumerate(intentions):
+            canned = _CANNED_RESPONSES.get(intention.strip().lower())
+            if canned:
+                results[index] = list(canned)
+                continue
+            
+            if intention in pending:
+                pending[intention][1].append(index)
+                continue
+            
+            cache_key = utterance_cache.make_key("gemini-2.5-flash", BATCH_SYSTEM_PROMPT, intention)
+            cached = utterance_cache.get(cache_key)
+            if cached:
+                print(f"Using cached utterances for '{intention}'...")
+                results[index] = cached
+            else:
+                pending[intention] = (cache_key, [index])
         
-        # Create filename with full timestamp
-        filename = f"utterances_{timestamp}.csv"
-        filepath = os.path.join(output_dir, filename)
+        if not pending:
+            return results
         
-        # Prepare data for CSV
-        csv_data = []
-        for i, utterance in enumerate(utterances, 1):
-            csv_data.append({
-                'id': i,
-                'utterance': utterance,
-                'original_intention': intention
-            })
+        try:
+            get_model(BATCH_SYSTEM_PROMPT)
+        except ValueError:
+            print("❌ GOOGLE_API_KEY not found!")
+            print("Please set your API key in the .env file")
+            return results
         
-        # Write to CSV
-        with open(filepath, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['id', 'utterance', 'original_intention']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        unique_intentions = list(pending)
+        for start in range(0, len(unique_intentions), BATCH_SIZE):
+            batch = unique_intentions[start:start + BATCH_SIZE]
+            
+            # One embedding request per batch; reuse utterances from previously
+            # seen intentions with the same meaning
+            try:
+                vectors = semantic_cache.embed_many(batch)
+            except Exception as e:
+                print(f"⚠️  Semantic cache unavailable: {e}")
+                vectors = [None] * len(batch)
+            
+            misses = []
+            for intention, intention_vector in zip(batch, vectors):
+                if intention_vector is not None:
+                    try:
+                        similar = semantic_cache.lookup(intention_vector, intention)
+                    except Exception as e:
+                        print(f"⚠️  Semantic cache lookup failed: {e}")
+                        similar = None
+                    if similar:
+                        print(f"Using cached utterances from a similar intention for '{intention}'...")
+                        for index in pending[intention][1]:
+                            results[index] = list(similar)
+                        continue
+                misses.append((intention, intention_vector))
             
-            writer.writeheader()
-            for row in csv_data:
-                writer.writerow(row)
+            if not misses:
+                continue
+            
+            print("Generating utterances using Gemini Flash...")
+            generated = _generate_batch([intention for intention, _ in misses])
+            for intention, intention_vector in misses:
+                utterances = generated.get(intention)
+                if not utterances:
+                    continue
+                
+                cache_key, indices = pending[intention]
+                for index in indices:
+                    results[index] = list(utterances)
+                utterance_cache.set(cache_key, utterances)
+                if intention_vector is not None:
+                    try:
+                        semantic_cache.add(intention_vector, intention, utterances)
+                    except Exception as e:
+                        print(f"⚠️  Could not update semantic cache: {e}")
         
-        print(f"Done! 10 utterances saved in {filepath} ✅")
-        return filepath
+        return results
         
     except Exception as e:
-        print(f"Error saving to CSV: {e}")
-        return None
+        print(f"Error generating utterances: {e}")
+        return results
+
+
+def generate_utterances_simple(intention: str):
+    """Generate utterances using Google Generative AI directly."""
+    return generate_utterances_batch([intention])[0]
 
 
 def main():
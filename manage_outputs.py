@@ -5,42 +5,63 @@ Utility script to manage utterance output folders
 
 import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 
+FOLDER_PREFIX = 'utterance_outputs_'
+MAX_DELETE_WORKERS = 8
+
+
+def _scan_output_folders():
+    """Return DirEntry objects for all output folders, sorted by name."""
+    # DirEntry caches the file type from the directory read, so no extra stat per item
+    with os.scandir('.') as entries:
+        folders = [e for e in entries if e.name.startswith(FOLDER_PREFIX) and e.is_dir()]
+    return sorted(folders, key=lambda e: e.name)
+
+
 def list_output_folders():
     """List all utterance output folders."""
-    folders = []
-    for item in os.listdir('.'):
-        if os.path.isdir(item) and item.startswith('utterance_outputs_'):
-            folders.append(item)
-    return sorted(folders)
+    return [entry.name for entry in _scan_output_folders()]
 
 
 def clean_old_folders(days_old=7):
     """Clean folders older than specified days."""
     cutoff_date = datetime.now() - timedelta(days=days_old)
-    cleaned = []
+    to_delete = []
     
-    for folder in list_output_folders():
+    for entry in _scan_output_folders():
         try:
             # Extract date from folder name
-            date_str = folder.replace('utterance_outputs_', '')
+            date_str = entry.name[len(FOLDER_PREFIX):]
             folder_date = datetime.strptime(date_str, '%Y%m%d')
-            
-            if folder_date < cutoff_date:
-                shutil.rmtree(folder)
-                cleaned.append(folder)
-                print(f"🗑️  Cleaned old folder: {folder}")
         except ValueError:
-            print(f"⚠️  Skipped folder with invalid date format: {folder}")
+            print(f"⚠️  Skipped folder with invalid date format: {entry.name}")
+            continue
+        
+        if folder_date < cutoff_date:
+            to_delete.append(entry)
+    
+    # Deletion is syscall-bound, so remove folders in parallel
+    cleaned = []
+    with ThreadPoolExecutor(max_workers=MAX_DELETE_WORKERS) as executor:
+        futures = [executor.submit(shutil.rmtree, entry.path) for entry in to_delete]
+        for entry, future in zip(to_delete, futures):
+            try:
+                future.result()
+            except OSError as e:
+                print(f"⚠️  Could not remove folder {entry.name}: {e}")
+                continue
+            cleaned.append(entry.name)
+            print(f"🗑️  Cleaned old folder: {entry.name}")
     
     return cleaned
 
 
 def show_folder_stats():
     """Show statistics about output folders."""
-    folders = list_output_folders()
+    folders = _scan_output_folders()
     
     if not folders:
         print("No output folders found.")
@@ -50,9 +71,10 @@ def show_folder_stats():
     
     total_files = 0
     for folder in folders:
-        files = [f for f in os.listdir(folder) if f.endswith('.csv')]
-        total_files += len(files)
-        print(f"   📁 {folder}: {len(files)} CSV files")
+        with os.scandir(folder.path) as entries:
+            csv_count = sum(1 for e in entries if e.name.endswith('.csv') and e.is_file())
+        total_files += csv_count
+        print(f"   📁 {folder.name}: {csv_count} CSV files")
     
     print(f"\nTotal CSV files: {total_files}")
 
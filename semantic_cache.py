@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Semantic near-match cache for generated utterances.
+Intentions are embedded and compared against previously generated ones, so
+paraphrased intentions can reuse an earlier result instead of a new generation.
+"""
+
+import json
+import re
+import sqlite3
+import time
+from typing import Optional
+
+import numpy as np
+
+import cache_db
+from gemini_retry import gemini_retry
+
+EMBEDDING_MODEL = "models/text-embedding-004"
+SIMILARITY_THRESHOLD = 0.92
+# Minimum token overlap with the matched intention, guards against false hits
+JACCARD_THRESHOLD = 0.3
+
+# Loaded lazily: one float32 row per cached intention, plus a parallel entry list
+_vectors = None
+_norms = None
+_entries = None
+
+
+def _load():
+    """Load the unexpired embedding matrix and entries from the database once per run."""
+    global _vectors, _norms, _entries
+    if _entries is not None:
+        return
+    try:
+        rows = cache_db.connect().execute(
+            "SELECT intention, embedding, utterances FROM semantic_cache"
+            " WHERE created_at > ? ORDER BY id",
+            (int(time.time()) - cache_db.CACHE_TTL,),
+        ).fetchall()
+    except (sqlite3.Error, OSError):
+        rows = []
+    
+    vectors, entries = [], []
+    for intention, embedding, utterances in rows:
+        vectors.append(np.frombuffer(embedding, dtype=np.float32))
+        entries.append({'intention': intention, 'utterances': json.loads(utterances)})
+    
+    # Only rows matching the newest embedding size are comparable (e.g. after a model change)
+    if vectors:
+        dim = vectors[-1].shape[0]
+        keep = [i for i, vector in enumerate(vectors) if vector.shape[0] == dim]
+        _vectors = np.vstack([vectors[i] for i in keep])
+        _norms = np.linalg.norm(_vectors, axis=1)
+        _entries = [entries[i] for i in keep]
+    else:
+        _vectors, _norms, _entries = None, None, []
+
+
+def _tokens(text: str) -> set:
+    return set(re.findall(r"\w+", text.lower()))
+
+
+def _jaccard(a: str, b: str) -> float:
+    ta, tb = _tokens(a), _tokens(b)
+    if not ta or not tb:
+        return 0.0
+    return len(ta & tb) / len(ta | tb)
+
+
+@gemini_retry
+def embed_many(intentions: list) -> np.ndarray:
+    """Embed several intentions in one request, one float32 row per intention.
+    
+    genai must already be configured with an API key.
+    """
+    import google.generativeai as genai
+
+    result = genai.embed_content(model=EMBEDDING_MODEL, content=list(intentions))
+    return np.asarray(result['embedding'], dtype=np.float32).reshape(len(intentions), -1)
+
+
+def lookup(vector: np.ndarray, intention: str) -> Optional[list]:
+    """Return cached utterances for the most similar stored intention, if close enough."""
+    _load()
+    if _vectors is None or not len(_vectors):
+        return None
+    # Cached rows from a different embedding model are not comparable
+    if vector.shape[0] != _vectors.shape[1]:
+        return None
+
+    # One matmul over every cached vector
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sims = _vectors @ vector / (_norms * np.linalg.norm(vector))
+    best = int(np.argmax(sims))
+    # A zero-norm vector gives NaN, which must not count as a match
+    if not np.isfinite(sims[best]) or sims[best] <= SIMILARITY_THRESHOLD:
+        return None
+
+    entry = _entries[best]
+    if _jaccard(intention, entry['intention']) <= JACCARD_THRESHOLD:
+        return None
+    return list(entry['utterances'])
+
+
+def add(vector: np.ndarray, intention: str, utterances: list) -> None:
+    """Append an intention embedding and its utterances to the cache."""
+    global _vectors, _norms
+    _load()
+    row = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+    try:
+        cache_db.connect().execute(
+            "INSERT INTO semantic_cache(intention, embedding, utterances, created_at) VALUES (?, ?, ?, ?)",
+            (intention, row.tobytes(), json.dumps(list(utterances), ensure_ascii=False), int(time.time())),
+        )
+    except (sqlite3.Error, OSError) as e:
+        print(f"⚠️  Could not write semantic cache: {e}")
+    
+    if _vectors is None or _vectors.shape[1] != row.shape[1]:
+        # First entry, or embedding size changed (e.g. new model); start a fresh matrix
+        _vectors = row
+        _entries.clear()
+    else:
+        _vectors = np.vstack([_vectors, row])
+    _entries.append({'intention': intention, 'utterances': list(utterances)})
+    _norms = np.linalg.norm(_vectors, axis=1)
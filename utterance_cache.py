@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Exact-match response cache for generated utterances.
+Results are stored in the shared SQLite cache database, keyed by a hash
+of the model, prompt and intention, so repeat runs skip the Gemini call.
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+from typing import Optional
+
+import cache_db
+
+# Same-run memo of hits only; misses always go back to the database, so an
+# entry written by another process after a miss is still picked up
+_hits = {}
+
+
+def make_key(model: str, prompt: str, intention: str) -> str:
+    """Build a deterministic cache key for a model/prompt/intention triple."""
+    payload = json.dumps(
+        {"model": model, "prompt": prompt, "intention": intention},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def get(key: str) -> Optional[list]:
+    """Return the cached utterances for key, or None on a miss."""
+    cached = _hits.get(key)
+    if cached is None:
+        try:
+            row = cache_db.connect().execute(
+                "SELECT utterances FROM utterance_cache WHERE key = ? AND created_at > ?",
+                (key, int(time.time()) - cache_db.CACHE_TTL),
+            ).fetchone()
+            if row is None:
+                return None
+            cached = _hits[key] = tuple(json.loads(row[0]))
+        except (sqlite3.Error, OSError, ValueError):
+            return None
+    return list(cached)
+
+
+def set(key: str, utterances: list) -> None:
+    """Store utterances under key. Cache write failures are not fatal."""
+    try:
+        cache_db.connect().execute(
+            "INSERT OR REPLACE INTO utterance_cache(key, utterances, created_at) VALUES (?, ?, ?)",
+            (key, json.dumps(list(utterances), ensure_ascii=False), int(time.time())),
+        )
+    except (sqlite3.Error, OSError) as e:
+        print(f"⚠️  Could not write utterance cache: {e}")
+        return
+    _hits[key] = tuple(utterances)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Shared building blocks for the utterance generators.
+Prompts, response parsing, user input and CSV output used by both main.py
+and main_simple.py. The Gemini SDK is only imported when a model is first needed.
+"""
+
+from __future__ import annotations
+
+import csv
+import os
+import re
+import threading
+from datetime import datetime
+
+SYSTEM_PROMPT = (
+    "Generate 10 diverse, natural utterances for the given intention. "
+    "Vary sentence structure, length, formality and perspective. "
+    "Return one utterance per line, without numbering or bullets."
+)
+PROMPT_TEMPLATE = 'Intention: "{}"'
+
+CSV_HEADER = ('id', 'utterance', 'original_intention')
+
+UTTERANCE_COUNT = 10
+# Fewer real utterances than this means the response failed, not that it needs padding
+MIN_UTTERANCES = 5
+
+# One shared model per system instruction, so the SDK is configured once and the
+# prompt is sent as the system instruction, giving every call an identical prefix.
+# Created lazily because main() may only populate GOOGLE_API_KEY after import.
+_MODELS = {}
+_MODELS_LOCK = threading.Lock()
+
+
+def get_model(system_instruction: str):
+    """Return the shared Gemini model for system_instruction, configuring the SDK on first use."""
+    model = _MODELS.get(system_instruction)
+    if model is None:
+        with _MODELS_LOCK:
+            model = _MODELS.get(system_instruction)
+            if model is None:
+                import google.generativeai as genai
+                
+                api_key = os.getenv('GOOGLE_API_KEY')
+                if not api_key:
+                    raise ValueError("GOOGLE_API_KEY not found in environment variables")
+                
+                genai.configure(api_key=api_key)
+                model = genai.GenerativeModel('gemini-2.5-flash', system_instruction=system_instruction)
+                _MODELS[system_instruction] = model
+    return model
+
+
+# Leading bullet characters and "1." / "1)" numbering stripped from each line
+_BULLET_CHARS = '-•*'
+_NUM_RE = re.compile(r'^\d+[.)]\s*')
+
+# An intention needs at least one real word, so gibberish never reaches the LLM
+_WORD_RE = re.compile(r'[A-Za-z]{3,}')
+
+
+def clean_line(line: str) -> str | None:
+    """Clean a single response line into an utterance, or None if it is blank."""
+    # str.strip/lstrip run in C; only lines starting with a digit pay for the regex
+    cleaned = line.strip().lstrip(_BULLET_CHARS).lstrip()
+    if cleaned[:1].isdigit():
+        cleaned = _NUM_RE.sub('', cleaned, count=1)
+    return cleaned or None
+
+
+def parse_utterances(text: str) -> list[str]:
+    """Split a one-utterance-per-line response into cleaned utterances."""
+    return [u for u in map(clean_line, text.splitlines()) if u]
+
+
+class IncompleteResponseError(Exception):
+    """Raised when a response holds too few usable utterances."""
+
+
+def pad_utterances(utterances: list[str], fallback: str) -> list[str]:
+    """Trim or pad utterances to exactly UTTERANCE_COUNT entries.
+    
+    Raises IncompleteResponseError if fewer than MIN_UTTERANCES are real, so
+    a failed generation is retried instead of being hidden behind filler.
+    """
+    if len(utterances) < MIN_UTTERANCES:
+        raise IncompleteResponseError(
+            f"only {len(utterances)} usable utterances, expected at least {MIN_UTTERANCES}"
+        )
+    utterances = utterances[:UTTERANCE_COUNT]
+    if len(utterances) < UTTERANCE_COUNT:
+        utterances.extend([fallback] * (UTTERANCE_COUNT - len(utterances)))
+    return utterances
+
+
+def is_valid_intention(intention: str) -> bool:
+    """Cheap check that an intention is worth an LLM call."""
+    return len(intention.split()) >= 2 and _WORD_RE.search(intention) is not None
+
+
+def get_user_input():
+    """Get user input for the intention/context."""
+    print("Hello! 👋 Welcome to the Utterance Generator.")
+    while True:
+        intention = input("Please enter an intention: ").strip()
+        
+        if not intention:
+            print("No intention provided. Exiting.")
+            return None
+        
+        if is_valid_intention(intention):
+            return intention
+        
+        print("Please describe the intention in at least two words, e.g. 'order coffee'.")
+
+
+def new_output_path():
+    """Return a timestamped CSV path inside today's output folder."""
+    # Take the time once so the folder date and file timestamp always agree
+    now = datetime.now()
+    timestamp = now.strftime("%Y%m%d_%H%M%S")
+    output_dir = f"utterance_outputs_{now.strftime('%Y%m%d')}"
+    
+    # Create filename with full timestamp
+    filename = f"utterances_{timestamp}.csv"
+    return os.path.join(output_dir, filename)
+
+
+def open_csv(filepath, buffering=-1):
+    """Open filepath for CSV writing, creating its output folder only now."""
+    os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+    return open(filepath, 'w', newline='', encoding='utf-8', buffering=buffering)
+
+
+def remove_output(filepath):
+    """Remove a partially written CSV, and its folder if that leaves it empty."""
+    if os.path.exists(filepath):
+        os.remove(filepath)
+    try:
+        os.rmdir(os.path.dirname(filepath))
+    except OSError:
+        # Folder still holds other outputs (or was never created)
+        pass
+
+
+def write_csv(filepath, utterances, intention):
+    """Write utterances and the header row to filepath."""
+    with open_csv(filepath, buffering=65536) as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(CSV_HEADER)
+        writer.writerows((i, utterance, intention) for i, utterance in enumerate(utterances, 1))
+
+
+def save_to_csv(utterances, intention):
+    """Save utterances to CSV with timestamp filename in separate folder."""
+    try:
+        filepath = new_output_path()
+        write_csv(filepath, utterances, intention)
+        
+        print(f"Done! {len(utterances)} utterances saved in {filepath} ✅")
+        return filepath
+        
+    except Exception as e:
+        print(f"Error saving to CSV: {e}")
+        return None